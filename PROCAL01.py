@@ -10,6 +10,9 @@ import os
 import speech_recognition as sr
 import matplotlib.pyplot as plt
 from datetime import datetime as dt
+from almacen_resultados import AlmacenResultados, mostrar_descarga
+
+RESULTADOS_POR_PAGINA = 10
 
 # Configuración de la página
 st.set_page_config(
@@ -107,12 +110,13 @@ def buscar_llamadas(fecha_desde, fecha_hasta):
 def descargar_audio(call_id, recording_url):
     try:
         headers = {"Authorization": f"Bearer {os.environ['HUBSPOT_ACCESS_TOKEN']}"}
-        response = requests.get(recording_url, headers=headers)
+        response = requests.get(recording_url, headers=headers, stream=True)
         response.raise_for_status()
         
         audio_file_path = f"{call_id}.wav"
         with open(audio_file_path, "wb") as audio_file:
-            audio_file.write(response.content)
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                audio_file.write(chunk)
         
         return audio_file_path
     except Exception as e:
@@ -228,6 +232,49 @@ def extraer_calificacion(analisis):
                 continue
     return 0
 
+# Función para mostrar resultados paginados desde disco
+def mostrar_resultados(almacen):
+    st.subheader("Resultados del Análisis")
+    
+    # Calificación promedio (acumulada al guardar cada llamada)
+    promedio = almacen.promedio
+    
+    # Mostrar semáforo
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        st.metric("Calificación Promedio", f"{promedio:.1f}/5.0")
+        
+        # Gráfico semaforizado
+        fig, ax = plt.subplots(figsize=(8, 1))
+        color = "green" if promedio >= 4 else "yellow" if promedio >= 2.5 else "red"
+        ax.barh(0, promedio, color=color)
+        ax.set_xlim(0, 5)
+        ax.set_xticks(range(6))
+        ax.set_yticks([])
+        ax.set_title("Desempeño General (Semaforizado)")
+        st.pyplot(fig)
+        plt.close(fig)
+    
+    # Mostrar análisis detallado por llamada, una página a la vez
+    num_paginas = almacen.num_paginas(RESULTADOS_POR_PAGINA)
+    pagina = st.number_input("Página", min_value=1, max_value=num_paginas, value=1, step=1)
+    st.caption(f"Página {pagina} de {num_paginas} ({almacen.total} llamadas)")
+    
+    for resumen in almacen.pagina(pagina, RESULTADOS_POR_PAGINA):
+        call_id = resumen["Call ID"]
+        with st.expander(f"Análisis de Llamada {call_id} (Calificación: {resumen['Calificación']}/5.0)"):
+            # El detalle se carga del disco solo al pedirlo
+            if st.checkbox("Ver detalle", key=f"ver_{call_id}"):
+                detalle = almacen.detalle(call_id)
+                st.subheader("Transcripción")
+                st.text_area("", detalle["Transcripción"], height=200, key=f"trans_{call_id}")
+                
+                st.subheader("Análisis Detallado")
+                st.markdown(detalle["Análisis"])
+    
+    # Opción para descargar resultados, escritos a disco por bloques
+    mostrar_descarga(almacen)
+
 # Interfaz principal
 if not hubspot_token or not google_api_key:
     st.warning("Por favor ingresa tus credenciales en la barra lateral para continuar.")
@@ -257,7 +304,16 @@ else:
         )
         
         if st.button("Analizar Llamadas Seleccionadas", disabled=not llamadas_seleccionadas):
-            resultados = []
+            # Cada lote nuevo reemplaza los resultados en disco del anterior
+            if "almacen" in st.session_state:
+                st.session_state.almacen.limpiar()
+            almacen = AlmacenResultados(
+                campo_id="Call ID",
+                campos_resumen=["Call ID", "Calificación"],
+                campos_detalle=["Transcripción", "Análisis"],
+                campo_puntaje="Calificación",
+            )
+            st.session_state.almacen = almacen
             progreso = st.progress(0)
             total_llamadas = len(llamadas_seleccionadas)
             
@@ -287,8 +343,8 @@ else:
                         if not analisis:
                             continue
                     
-                    # Guardar resultados
-                    resultados.append({
+                    # Guardar resultados en disco en cuanto termina la llamada
+                    almacen.agregar({
                         "Call ID": call_id,
                         "Transcripción": transcripcion,
                         "Análisis": analisis,
@@ -305,45 +361,9 @@ else:
             
             progreso.empty()
             
-            if resultados:
-                # Mostrar resultados
-                st.subheader("Resultados del Análisis")
-                
-                # Calificación promedio
-                df_resultados = pd.DataFrame(resultados)
-                promedio = df_resultados["Calificación"].mean()
-                
-                # Mostrar semáforo
-                col1, col2, col3 = st.columns([1, 2, 1])
-                with col2:
-                    st.metric("Calificación Promedio", f"{promedio:.1f}/5.0")
-                    
-                    # Gráfico semaforizado
-                    fig, ax = plt.subplots(figsize=(8, 1))
-                    color = "green" if promedio >= 4 else "yellow" if promedio >= 2.5 else "red"
-                    ax.barh(0, promedio, color=color)
-                    ax.set_xlim(0, 5)
-                    ax.set_xticks(range(6))
-                    ax.set_yticks([])
-                    ax.set_title("Desempeño General (Semaforizado)")
-                    st.pyplot(fig)
-                
-                # Mostrar análisis detallado por llamada
-                for idx, resultado in enumerate(resultados, 1):
-                    with st.expander(f"Análisis de Llamada {resultado['Call ID']} (Calificación: {resultado['Calificación']}/5.0)"):
-                        st.subheader("Transcripción")
-                        st.text_area("", resultado["Transcripción"], height=200, key=f"trans_{idx}")
-                        
-                        st.subheader("Análisis Detallado")
-                        st.markdown(resultado["Análisis"])
-                
-                # Opción para descargar resultados
-                csv = df_resultados.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label="Descargar Resultados (CSV)",
-                    data=csv,
-                    file_name="analisis_llamadas.csv",
-                    mime="text/csv"
-                )
-            else:
-                st.warning("No se pudo analizar ninguna llamada. Por favor revisa los errores.")
\ No newline at end of file
+            if not almacen.total:
+                st.warning("No se pudo analizar ninguna llamada. Por favor revisa los errores.")
+        
+        # Los resultados viven en disco, así que sobreviven a los reruns de paginación y descarga
+        if "almacen" in st.session_state and st.session_state.almacen.total:
+            mostrar_resultados(st.session_state.almacen)
@@ -11,9 +11,11 @@ import os
 import time
 from colorama import Fore, Style, init
 import tempfile
+from almacen_resultados import AlmacenResultados, mostrar_descarga
 
 # Inicializar configuraciones
 init(autoreset=True)
+RESULTADOS_POR_PAGINA = 10
 
 # =============================================
 # CONFIGURACIÓN SEGURA DE API KEYS
@@ -123,7 +125,7 @@ def download_call_audio(call_id, url):
         }
         
         with st.spinner(f"Descargando {call_id}..."):
-            response = requests.get(url, headers=headers, timeout=(10, 30))
+            response = requests.get(url, headers=headers, timeout=(10, 30), stream=True)
             response.raise_for_status()
             
             if 'audio' not in response.headers.get('Content-Type', ''):
@@ -131,7 +133,8 @@ def download_call_audio(call_id, url):
                 return None
             
             temp_file = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-            temp_file.write(response.content)
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                temp_file.write(chunk)
             temp_file.close()
             
             return temp_file.name
@@ -184,6 +187,51 @@ Finaliza con puntuación 1-5 y feedback constructivo."""
         st.error(f"Error en análisis: {str(e)[:200]}")
     return None
 
+def get_results_store(selected):
+    """Devuelve el almacén en disco de la selección actual y el conjunto de
+    llamadas fallidas; si la selección cambia, descarta ambos para no mezclar
+    llamadas de otros lotes"""
+    seleccion = frozenset(selected)
+    if st.session_state.get("almacen_seleccion") != seleccion:
+        if "almacen" in st.session_state:
+            st.session_state.almacen.limpiar()
+        st.session_state.almacen_seleccion = seleccion
+        st.session_state.fallidos = set()
+        st.session_state.almacen = AlmacenResultados(
+            campo_id="ID",
+            campos_resumen=["ID", "Fecha", "Puntaje"],
+            campos_detalle=["Transcripción", "Análisis"],
+            campo_puntaje="Puntaje",
+        )
+    return st.session_state.almacen, st.session_state.fallidos
+
+def show_results(almacen):
+    """Muestra los resultados paginados y carga los detalles bajo demanda"""
+    st.success(f"Análisis completado para {almacen.total} llamadas")
+    
+    with st.expander("📋 Resultados detallados", expanded=True):
+        num_paginas = almacen.num_paginas(RESULTADOS_POR_PAGINA)
+        pagina = st.number_input("Página", min_value=1, max_value=num_paginas, value=1, step=1)
+        st.caption(f"Página {pagina} de {num_paginas}")
+        
+        df_pagina = pd.DataFrame(almacen.pagina(pagina, RESULTADOS_POR_PAGINA))
+        st.dataframe(df_pagina)
+        
+        call_id = st.selectbox("Ver detalle de la llamada", options=df_pagina["ID"].tolist())
+        if call_id is not None:
+            detalle = almacen.detalle(call_id)
+            st.text_area("Transcripción", value=detalle["Transcripción"], height=150)
+            st.markdown(detalle["Análisis"])
+        
+    # Reporte consolidado
+    st.metric("Puntaje promedio", f"{almacen.promedio:.1f}/5")
+    
+    # Gráfico de distribución
+    st.bar_chart(pd.Series(almacen.conteo_puntajes()))
+    
+    # Exportación escrita a disco por bloques
+    mostrar_descarga(almacen)
+
 # =============================================
 # INTERFAZ DE USUARIO
 # =============================================
@@ -245,11 +293,18 @@ def main_interface():
             st.warning("Selecciona al menos una llamada")
             return
 
-    # Paso 4: Procesamiento
-    resultados = []
+    # Paso 4: Procesamiento (ni las llamadas guardadas ni las fallidas se
+    # reprocesan, así que navegar los resultados no repite llamadas a las APIs)
+    almacen, fallidos = get_results_store(selected)
     progress = st.progress(0)
     
     for i, call_id in enumerate(selected, 1):
+        if almacen.contiene(call_id) or call_id in fallidos:
+            progress.progress(i/len(selected))
+            continue
+        
+        # Se marca como fallida hasta que su resultado quede guardado
+        fallidos.add(call_id)
         call = df_calls[df_calls["ID"] == call_id].iloc[0]
         
         with st.expander(f"Procesando {call_id}"):
@@ -267,13 +322,14 @@ def main_interface():
             analysis = analyze_call(text)
             if analysis:
                 score = min(5, max(1, analysis.count("✅")))  # Puntaje 1-5
-                resultados.append({
+                almacen.agregar({
                     "ID": call_id,
                     "Fecha": call["Fecha"],
-                    "Transcripción": text[:300] + "..." if len(text) > 300 else text,
+                    "Transcripción": text,
                     "Análisis": analysis,
                     "Puntaje": score
                 })
+                fallidos.discard(call_id)
             
             # Limpiar
             try:
@@ -285,19 +341,11 @@ def main_interface():
         progress.progress(i/len(selected))
 
     # Resultados
-    if resultados:
-        st.success(f"Análisis completado para {len(resultados)} llamadas")
-        df_resultados = pd.DataFrame(resultados)
-        
-        with st.expander("📋 Resultados detallados", expanded=True):
-            st.dataframe(df_resultados)
-            
-        # Reporte consolidado
-        avg_score = df_resultados["Puntaje"].mean()
-        st.metric("Puntaje promedio", f"{avg_score:.1f}/5")
-        
-        # Gráfico de distribución
-        st.bar_chart(df_resultados["Puntaje"].value_counts().sort_index())
+    if fallidos:
+        st.warning(f"{len(fallidos)} llamadas no se pudieron analizar; cambia la selección para reintentarlas")
+    
+    if almacen.total:
+        show_results(almacen)
     else:
         st.warning("No se pudo completar ningún análisis")
 
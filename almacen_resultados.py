@@ -0,0 +1,205 @@
+"""Almacenamiento en disco de los resultados del análisis de llamadas.
+
+Cada llamada analizada se escribe a disco en cuanto termina: los campos
+ligeros (ID, fecha, puntaje) van a un índice JSONL y la transcripción y el
+análisis completos a un archivo JSON propio. La interfaz lee el índice por
+páginas y carga los detalles bajo demanda, de modo que la memoria de cada
+sesión no crece con el tamaño del lote. Las exportaciones se escriben a disco
+por bloques; st.download_button no puede servir un archivo desde disco sin
+leerlo entero, así que los bytes solo se adjuntan en la ejecución en la que el
+usuario pide la descarga.
+"""
+import csv
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import weakref
+from itertools import islice
+
+import streamlit as st
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet es opcional
+    pa = None
+    pq = None
+
+TAMANO_BLOQUE = 200
+PARQUET_DISPONIBLE = pa is not None
+TIPOS_MIME = {"csv": "text/csv", "parquet": "application/octet-stream"}
+
+
+class AlmacenResultados:
+    """Resultados de un lote de llamadas guardados en un directorio temporal"""
+
+    def __init__(self, campo_id, campos_resumen, campos_detalle, campo_puntaje):
+        self.campo_id = campo_id
+        self.campos_resumen = list(campos_resumen)
+        self.campos_detalle = list(campos_detalle)
+        self.campo_puntaje = campo_puntaje
+        self.directorio = tempfile.mkdtemp(prefix="resultados_llamadas_")
+        self.ruta_indice = os.path.join(self.directorio, "indice.jsonl")
+        self.total = 0
+        self.suma_puntaje = 0.0
+        self._exportaciones = {}
+        # Las transcripciones son datos de clientes: el directorio se borra
+        # cuando la sesión libera el almacén o cuando termina el proceso
+        self._finalizador = weakref.finalize(self, shutil.rmtree, self.directorio, True)
+
+    @property
+    def campos(self):
+        return self.campos_resumen + self.campos_detalle
+
+    def _ruta_detalle(self, call_id):
+        # El ID se resume con un hash para que nunca pueda salir del directorio
+        clave = hashlib.sha256(str(call_id).encode("utf-8")).hexdigest()
+        return os.path.join(self.directorio, f"detalle_{clave}.json")
+
+    def _esquema_parquet(self):
+        return pa.schema([
+            (c, pa.float64() if c == self.campo_puntaje else pa.string())
+            for c in self.campos
+        ])
+
+    def agregar(self, resultado):
+        """Escribe un resultado a disco; el detalle primero para que el índice
+        nunca apunte a una llamada incompleta. Una llamada ya guardada se ignora
+        para que el índice, el promedio y las exportaciones no la dupliquen"""
+        call_id = resultado[self.campo_id]
+        if self.contiene(call_id):
+            return False
+
+        with open(self._ruta_detalle(call_id), "w", encoding="utf-8") as f:
+            json.dump({c: resultado.get(c) for c in self.campos_detalle}, f, ensure_ascii=False)
+
+        resumen = {c: resultado.get(c) for c in self.campos_resumen}
+        with open(self.ruta_indice, "a", encoding="utf-8") as f:
+            f.write(json.dumps(resumen, ensure_ascii=False) + "\n")
+
+        self.total += 1
+        self.suma_puntaje += float(resultado.get(self.campo_puntaje) or 0)
+        return True
+
+    def contiene(self, call_id):
+        return os.path.exists(self._ruta_detalle(call_id))
+
+    @property
+    def promedio(self):
+        return self.suma_puntaje / self.total if self.total else 0.0
+
+    def _iterar_resumenes(self):
+        if not os.path.exists(self.ruta_indice):
+            return
+        with open(self.ruta_indice, encoding="utf-8") as f:
+            for linea in f:
+                yield json.loads(linea)
+
+    def num_paginas(self, tamano_pagina):
+        return max(1, -(-self.total // tamano_pagina))
+
+    def pagina(self, numero, tamano_pagina):
+        """Devuelve los resúmenes de la página indicada (empezando en 1)"""
+        inicio = (numero - 1) * tamano_pagina
+        return list(islice(self._iterar_resumenes(), inicio, inicio + tamano_pagina))
+
+    def detalle(self, call_id):
+        """Carga la transcripción y el análisis de una sola llamada"""
+        with open(self._ruta_detalle(call_id), encoding="utf-8") as f:
+            return json.load(f)
+
+    def conteo_puntajes(self):
+        conteo = {}
+        for resumen in self._iterar_resumenes():
+            puntaje = resumen.get(self.campo_puntaje)
+            conteo[puntaje] = conteo.get(puntaje, 0) + 1
+        return dict(sorted(conteo.items()))
+
+    def iterar_bloques(self, tamano=TAMANO_BLOQUE):
+        """Recorre los resultados completos en bloques de `tamano` filas"""
+        resumenes = self._iterar_resumenes()
+        while True:
+            bloque = list(islice(resumenes, tamano))
+            if not bloque:
+                return
+            for resumen in bloque:
+                resumen.update(self.detalle(resumen[self.campo_id]))
+            yield bloque
+
+    def exportacion_vigente(self, formato):
+        """Ruta de la exportación ya generada para el lote actual, o None"""
+        ruta = self._exportaciones.get(formato)
+        if ruta and ruta[0] == self.total and os.path.exists(ruta[1]):
+            return ruta[1]
+        return None
+
+    def exportar_csv(self):
+        """Escribe el CSV a disco por bloques y devuelve su ruta"""
+        ruta = self.exportacion_vigente("csv")
+        if ruta:
+            return ruta
+
+        ruta = os.path.join(self.directorio, "export.csv")
+        with open(ruta, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.campos)
+            writer.writeheader()
+            for bloque in self.iterar_bloques():
+                writer.writerows(bloque)
+
+        self._exportaciones["csv"] = (self.total, ruta)
+        return ruta
+
+    def exportar_parquet(self):
+        """Escribe el Parquet a disco, un row group por bloque, y devuelve su ruta"""
+        if not PARQUET_DISPONIBLE:
+            raise RuntimeError("Exportar a Parquet requiere pyarrow")
+
+        ruta = self.exportacion_vigente("parquet")
+        if ruta:
+            return ruta
+
+        ruta = os.path.join(self.directorio, "export.parquet")
+        # Esquema explícito: inferirlo del primer bloque da tipo null a las
+        # columnas vacías y rompe los bloques siguientes
+        esquema = self._esquema_parquet()
+        with pq.ParquetWriter(ruta, esquema) as writer:
+            for bloque in self.iterar_bloques():
+                for fila in bloque:
+                    for c in self.campos:
+                        valor = fila.get(c)
+                        if c == self.campo_puntaje:
+                            fila[c] = float(valor or 0)
+                        else:
+                            fila[c] = None if valor is None else str(valor)
+                writer.write_table(pa.Table.from_pylist(bloque, schema=esquema))
+
+        self._exportaciones["parquet"] = (self.total, ruta)
+        return ruta
+
+    def exportar(self, formato):
+        return self.exportar_parquet() if formato == "parquet" else self.exportar_csv()
+
+    def limpiar(self):
+        self._finalizador()
+
+
+def mostrar_descarga(almacen, nombre_archivo="analisis_llamadas"):
+    """Selector de formato y botón de descarga. El archivo se genera en disco
+    solo para el formato elegido, y sus bytes se adjuntan al botón únicamente
+    en la ejecución en la que el usuario pulsa "Preparar descarga"; el resto de
+    reruns (paginación, detalles) no vuelven a cargarlo en memoria"""
+    formatos = ["CSV", "Parquet"] if PARQUET_DISPONIBLE else ["CSV"]
+    formato = st.radio("Formato de descarga", formatos, horizontal=True).lower()
+
+    if st.button(f"Preparar descarga ({formato.upper()})"):
+        with st.spinner("Generando archivo..."):
+            ruta = almacen.exportar(formato)
+        with open(ruta, "rb") as archivo:
+            st.download_button(
+                label=f"Descargar Resultados ({formato.upper()})",
+                data=archivo,
+                file_name=f"{nombre_archivo}.{formato}",
+                mime=TIPOS_MIME[formato]
+            )